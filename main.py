@@ -1,125 +1,320 @@
-# pip install sounddevice numpy matplotlib
+# pip install sounddevice "numpy>=1.24" numba rocket-fft matplotlib
 
-import queue
-import threading
 import math
+import time as _time
 import numpy as np
 import sounddevice as sd
 import matplotlib.pyplot as plt
+from numba import njit
+import rocket_fft
+
+# rocket-fft makes np.fft callable inside @njit functions (backed by
+# pocketfft). scipy_like() keeps float32 input in float32/complex64
+# instead of upcasting to float64.
+rocket_fft.scipy_like()
 
 # ========== Config ==========
 SAMPLE_RATE = 44100       # Hz
-BLOCK_SIZE = 2048         # Frames per audio block
+BLOCK_SIZE = 1024         # Frames per audio block
+ANALYSIS_SIZE = 4 * BLOCK_SIZE  # Analysis frame: last 4 blocks, 75% overlap
+FFT_SIZE = 2 * ANALYSIS_SIZE    # Zero-padded FFT length (spectral path)
 CHANNELS = 1              # Mono
 BUFFER_SECONDS = 2.0      # Seconds of audio to display in waveform
 PLOT_SAMPLES = int(SAMPLE_RATE * 0.1)  # Show last 0.1s in the waveform
+PLOT_FPS = 30             # Display refresh cap (blitted redraws per second)
+
+# Pitch estimator: "yin" (time-domain autocorrelation, sub-Hz accuracy on
+# monophonic input) or "fft" (spectral peak + sub-bin interpolation).
+PITCH_METHOD = "yin"
+YIN_FMIN = 60.0           # Lowest pitch YIN will search for (Hz)
+YIN_FMAX = 2000.0         # Highest pitch YIN will search for (Hz)
+YIN_THRESHOLD = 0.1       # Normalized-difference dip threshold (de Cheveigné)
 
-# Calibration controls (applied after FFT frequency calculation)
+# Calibration controls (applied after the pitch estimate)
+# - ENABLE_CALIBRATION turns the correction on/off.
 # - CALIBRATION_SCALE lets you correct sample-rate drift (multiply measured freq).
 #   For example, if a 1000 Hz tone shows as 990 Hz, set CALIBRATION_SCALE = 1000/990.
 # - CALIBRATION_OFFSET_HZ applies a fixed offset after scaling.
+ENABLE_CALIBRATION = True
 CALIBRATION_SCALE = (500 - 2000) / (499.7 - 2000.7) # (f2 - f1) / (m2 - m1)
 CALIBRATION_OFFSET_HZ = (2000 - CALIBRATION_SCALE * 2000.7) + 0.4 # f1 - CALIBRATION_SCALE * m1
 
 # ============================
 # Globals
 # ============================
-audio_queue = queue.Queue()
 latest_freq = 0.0
 
-# A circular buffer to hold audio for plotting
-buffer_length = int(SAMPLE_RATE * BUFFER_SECONDS)
-audio_buffer = np.zeros(buffer_length, dtype=np.float32)
+# Precomputed Hann window for the analysis frame. ANALYSIS_SIZE is
+# fixed, so computing this once at import time avoids re-evaluating the
+# cosines (and allocating a fresh array) on the processing thread.
+HANN_ANALYSIS = np.hanning(ANALYSIS_SIZE).astype(np.float32)
+
+# The spectral leakage skirt around DC spans several (zero-padded) bins,
+# so the peak search ignores the first few.
+_MIN_BIN = 6
+
+# Hz per (zero-padded) FFT bin, hoisted so the per-block conversion is a
+# single multiply.
+_BIN_HZ = SAMPLE_RATE / FFT_SIZE
+
+# YIN lag-search range in samples, clamped so the difference function
+# always sums over half the analysis frame.
+_TAU_MIN = max(2, int(SAMPLE_RATE / YIN_FMAX))
+_TAU_MAX = min(int(SAMPLE_RATE / YIN_FMIN), ANALYSIS_SIZE // 2 - 1)
+
+# Samples are stored as int16 end to end (PortAudio's native format, and
+# more precision than the waveform display can show); they are widened
+# to float32 only at the FFT input. This halves plot-buffer memory and
+# the memcpy bandwidth on the callback.
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
+# All analysis state lives with the audio callback: the whole per-block
+# analysis is a handful of nogil JIT kernels taking well under a
+# millisecond, so there is no worker thread (or queue/ring handoff) at
+# all — the callback analyzes in place and publishes latest_freq with a
+# single atomic-under-the-GIL store.
+fft_frame = np.zeros(ANALYSIS_SIZE, dtype=np.float32)  # sliding analysis frame
+# Windowed-frame scratch, zero-padded out to FFT_SIZE: the kernel only
+# ever writes the first ANALYSIS_SIZE entries, the tail stays zero. The
+# padding interpolates the spectrum (2x finer bins around the peak)
+# without widening the actual analysis window.
+_win_frame = np.zeros(FFT_SIZE, dtype=np.float32)
+_power = np.empty(FFT_SIZE // 2 + 1, dtype=np.float32)  # FFT-path scratch
+_cmnd = np.empty(_TAU_MAX + 1, dtype=np.float32)  # YIN-path scratch
+
+# A circular buffer to hold audio for plotting. Single writer (the
+# processing thread) and single reader (the plot loop), so no lock is
+# needed: the worst case is the plot reading a partially updated window,
+# which shows for one frame. The length is rounded up to the next power
+# of two so index wraparound is a bitmask rather than a division.
+buffer_length = 1 << int(SAMPLE_RATE * BUFFER_SECONDS).bit_length()
+BUFFER_MASK = buffer_length - 1
+audio_buffer = np.zeros(buffer_length, dtype=np.int16)
 buffer_index = 0
-buffer_lock = threading.Lock()
 
 
 def audio_callback(indata, frames, time, status):
-    """PortAudio callback: receives audio blocks from the mic."""
+    """PortAudio callback: analyze the block in place and publish results.
+
+    Everything here is a nogil JIT kernel over preallocated buffers —
+    no locks, no allocation, no queue handoff — so it is safe on the
+    realtime thread and finishes well under a millisecond.
+    """
+    global buffer_index, latest_freq
+
     if status:
         print(status, flush=True)
 
-    # indata shape: (frames, channels)
-    mono_block = indata[:, 0].copy()
-
-    # Send block to queue for processing (FFT, plotting update)
-    audio_queue.put(mono_block)
-
-
-def process_audio_blocks():
-    """Thread function: consume audio blocks, update buffer & frequency estimate."""
-    global audio_buffer, buffer_index, latest_freq
-
-    while True:
-        block = audio_queue.get()
-        if block is None:
-            break  # Stop signal
-
-        # === Update ring buffer for plotting ===
-        with buffer_lock:
-            n = len(block)
-            end_index = buffer_index + n
-            if end_index <= buffer_length:
-                audio_buffer[buffer_index:end_index] = block
-            else:
-                # Wrap around
-                first_part = buffer_length - buffer_index
-                audio_buffer[buffer_index:] = block[:first_part]
-                audio_buffer[:n - first_part] = block[first_part:]
-            buffer_index = (buffer_index + n) % buffer_length
-
-        # === Estimate dominant frequency using FFT ===
-        # Apply a window to reduce spectral leakage
-        window = np.hanning(len(block))
-        block_win = block * window
-
-        # Real FFT
-        fft_vals = np.fft.rfft(block_win)
-        mags = np.abs(fft_vals)
-
-        # Ignore DC (index 0), find peak magnitude bin
-        mags[0] = 0
-        peak_idx = np.argmax(mags)
-
-        # Quadratic (parabolic) interpolation around the peak bin to improve
-        # sub-bin accuracy: estimate the vertex of the parabola fitted to the
-        # log-magnitude spectrum. Skip if the peak is at an edge bin.
-        if 1 <= peak_idx < len(mags) - 1:
-            alpha = mags[peak_idx - 1]
-            beta = mags[peak_idx]
-            gamma = mags[peak_idx + 1]
-
-            denominator = (alpha - 2 * beta + gamma)
-            if denominator != 0:
-                peak_adj = 0.5 * (alpha - gamma) / denominator
-            else:
-                peak_adj = 0.0
-        else:
-            peak_adj = 0.0
+    # indata shape: (frames, channels). With CHANNELS == 1 the reshape is
+    # a zero-copy view of the whole C-contiguous buffer, unlike a column
+    # slice, which becomes a strided view the moment channels > 1. (If
+    # stereo is ever added, keep each channel in its own contiguous
+    # buffer rather than slicing the interleaved layout per block.)
+    block = indata.reshape(-1)
+
+    # Update the ring buffer for plotting.
+    buffer_index = _copy_to_ring(block, audio_buffer, buffer_index)
+
+    # Slide the analysis frame left one block and widen the new int16
+    # block to float32 in [-1, 1) straight into its tail.
+    _slide_frame(fft_frame, block, _INT16_SCALE)
+
+    if PITCH_METHOD == "yin":
+        # Time-domain: autocorrelation-style difference function on the
+        # raw (unwindowed) frame.
+        freq = _yin_pitch(
+            fft_frame, _TAU_MIN, _TAU_MAX, YIN_THRESHOLD, SAMPLE_RATE, _cmnd
+        )
+    else:
+        # Spectral: windowed FFT peak with sub-bin interpolation.
+        peak_idx, peak_adj = _process(
+            fft_frame, HANN_ANALYSIS, _win_frame, _power, _MIN_BIN
+        )
+        freq = (peak_idx + peak_adj) * _BIN_HZ
+
+    # Apply calibration to correct device-specific drift or offsets.
+    # 0.0 is the unvoiced/silence sentinel and must pass through
+    # uncalibrated so the display falls back to '--'.
+    if ENABLE_CALIBRATION and freq > 0.0:
+        freq = freq * CALIBRATION_SCALE + CALIBRATION_OFFSET_HZ
 
-        # Convert (potentially sub-bin) index to frequency in Hz
-        freq = (peak_idx + peak_adj) * SAMPLE_RATE / len(block)
+    latest_freq = freq
 
-        # Apply calibration to correct device-specific drift or offsets
-        freq = freq * CALIBRATION_SCALE + CALIBRATION_OFFSET_HZ
 
-        # Apply calibration to correct device-specific drift or offsets
-        freq = freq * CALIBRATION_SCALE + CALIBRATION_OFFSET_HZ
+@njit(nogil=True, cache=True, fastmath=True)
+def _copy_to_ring(block, ring, start):
+    """Copy ``block`` into the plot ring buffer at ``start`` (with
+    wraparound). ``ring`` must have a power-of-two length so the wrap is
+    a bitmask instead of a division. Returns the new ring-buffer index.
+    """
+    n = block.shape[0]
+    mask = ring.shape[0] - 1
+    for i in range(n):
+        ring[(start + i) & mask] = block[i]
+    return (start + n) & mask
 
-        latest_freq = freq
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _slide_frame(frame, block, scale):
+    """Shift ``frame`` left by one block and write ``block`` (widened to
+    float and scaled by ``scale``) into its tail.
+    """
+    n = block.shape[0]
+    m = frame.shape[0]
+    for i in range(m - n):
+        frame[i] = frame[i + n]
+    for i in range(n):
+        frame[m - n + i] = block[i] * scale
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _find_peak(re, im, power, min_bin):
+    """Fused kernel: power spectrum, DC-guarded argmax, and Gaussian
+    (log-magnitude) parabolic interpolation. Bins below ``min_bin`` are
+    excluded from the search (but still computed, so interpolation at
+    ``min_bin`` has a left neighbour). Returns (peak_idx, peak_adj).
+    """
+    n = re.shape[0]
+    peak_idx = 0
+    peak_val = 0.0
+    for i in range(n):
+        p = re[i] * re[i] + im[i] * im[i]
+        power[i] = p
+        if i >= min_bin and p > peak_val:
+            peak_val = p
+            peak_idx = i
+
+    # Parabolic interpolation on the *log*-magnitude spectrum ("Gaussian
+    # interpolation"): a windowed sinusoid's main lobe is close to a
+    # parabola in log magnitude, so this has a much smaller sub-bin error
+    # than interpolating raw magnitudes. log|X| = 0.5*log|X|^2, so only
+    # three log() calls are needed. Skip at an edge bin or if a
+    # neighbour bin is exactly zero (silence).
+    peak_adj = 0.0
+    if (1 <= peak_idx < n - 1
+            and power[peak_idx - 1] > 0.0
+            and power[peak_idx] > 0.0
+            and power[peak_idx + 1] > 0.0):
+        alpha = 0.5 * math.log(power[peak_idx - 1])
+        beta = 0.5 * math.log(power[peak_idx])
+        gamma = 0.5 * math.log(power[peak_idx + 1])
+
+        denominator = alpha - 2.0 * beta + gamma
+        if denominator != 0.0:
+            peak_adj = 0.5 * (alpha - gamma) / denominator
+
+    return peak_idx, peak_adj
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _process(frame, hann, win_buf, power, min_bin):
+    """Whole per-frame analysis — Hann window, real FFT (via rocket-fft),
+    power spectrum, argmax, and sub-bin interpolation — in one nogil JIT
+    region, so the audio thread never round-trips through the Python
+    interpreter (or contends for the GIL) per block. The windowed frame
+    is written into the caller-owned ``win_buf`` scratch so the kernel
+    does not allocate a temporary per call; ``win_buf`` may be longer
+    than ``frame``, in which case its (zero) tail pads the FFT.
+    Returns (peak_idx, peak_adj).
+    """
+    for i in range(frame.shape[0]):
+        win_buf[i] = frame[i] * hann[i]
+    fft_vals = np.fft.rfft(win_buf)
+    return _find_peak(fft_vals.real, fft_vals.imag, power, min_bin)
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _yin_pitch(frame, tau_min, tau_max, threshold, sample_rate, cmnd):
+    """YIN pitch estimator (de Cheveigné & Kawahara 2002) on the analysis
+    frame: cumulative-mean-normalized difference function over lags
+    [tau_min, tau_max], first dip below ``threshold`` (tracked to its
+    local minimum), then parabolic refinement of the lag. Time-domain, so
+    accuracy is not tied to FFT bin spacing. The normalized difference is
+    written into the caller-owned ``cmnd`` scratch (length tau_max + 1)
+    so the kernel does not allocate per call. Returns the pitch in Hz,
+    or 0.0 if no periodicity is found (unvoiced / silence).
+    """
+    w = frame.shape[0] // 2
+
+    # Difference function and its cumulative-mean normalization in one
+    # pass over the lags.
+    cmnd[0] = 1.0
+    running_sum = 0.0
+    for tau in range(1, tau_max + 1):
+        acc = 0.0
+        for i in range(w):
+            diff = frame[i] - frame[i + tau]
+            acc += diff * diff
+        running_sum += acc
+        if running_sum > 0.0:
+            cmnd[tau] = acc * tau / running_sum
+        else:
+            cmnd[tau] = 1.0
+
+    # First dip under the threshold, followed down to its local minimum.
+    best_tau = -1
+    tau = tau_min
+    while tau < tau_max:
+        if cmnd[tau] < threshold:
+            while tau + 1 < tau_max and cmnd[tau + 1] < cmnd[tau]:
+                tau += 1
+            best_tau = tau
+            break
+        tau += 1
+    if best_tau == -1:
+        return 0.0
+
+    # Parabolic refinement of the lag for sub-sample precision.
+    adj = 0.0
+    if 1 <= best_tau < tau_max:
+        a = cmnd[best_tau - 1]
+        b = cmnd[best_tau]
+        c = cmnd[best_tau + 1]
+        denominator = a - 2.0 * b + c
+        if denominator != 0.0:
+            adj = 0.5 * (a - c) / denominator
+
+    return sample_rate / (best_tau + adj)
+
+
+def _warmup_kernels():
+    """Compile every audio-path JIT kernel ahead of time (on zeros)."""
+    silence = np.zeros(BLOCK_SIZE, dtype=np.int16)
+    _copy_to_ring(silence, audio_buffer, 0)
+    _slide_frame(fft_frame, silence, _INT16_SCALE)
+    _yin_pitch(fft_frame, _TAU_MIN, _TAU_MAX, YIN_THRESHOLD, SAMPLE_RATE, _cmnd)
+    _process(fft_frame, HANN_ANALYSIS, _win_frame, _power, _MIN_BIN)
+    fft_frame[:] = 0.0
+
+
+# Reused output buffer for get_latest_plot_samples: the int16->float
+# widening lands straight in here, so the plot read allocates nothing.
+_plot_out = np.empty(PLOT_SAMPLES, dtype=np.float32)
 
 
 def get_latest_plot_samples():
-    """Return the latest samples from the circular buffer for plotting."""
-    with buffer_lock:
-        if buffer_index >= PLOT_SAMPLES:
-            data = audio_buffer[buffer_index - PLOT_SAMPLES:buffer_index]
-        else:
-            # Wrap
-            first_part = audio_buffer[buffer_length - (PLOT_SAMPLES - buffer_index):]
-            second_part = audio_buffer[:buffer_index]
-            data = np.concatenate((first_part, second_part))
-    return data
+    """Return the latest samples from the circular buffer for plotting.
+
+    Returns a buffer reused across calls; the caller should only read it.
+    """
+    # Snapshot the index once; the audio callback may advance it while
+    # we copy, which at worst smears one frame of the display.
+    index = buffer_index
+    start = (index - PLOT_SAMPLES) & BUFFER_MASK
+    if start + PLOT_SAMPLES <= buffer_length:
+        # Common case: one contiguous gather + widen.
+        np.multiply(
+            audio_buffer[start:start + PLOT_SAMPLES], _INT16_SCALE,
+            out=_plot_out,
+        )
+    else:
+        # Wrap: two pieces into the same output buffer.
+        k = buffer_length - start
+        np.multiply(audio_buffer[start:], _INT16_SCALE, out=_plot_out[:k])
+        np.multiply(
+            audio_buffer[:PLOT_SAMPLES - k], _INT16_SCALE, out=_plot_out[k:]
+        )
+    return _plot_out
 
 
 # ============================
@@ -128,6 +323,14 @@ def get_latest_plot_samples():
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F",
               "F#", "G", "G#", "A", "A#", "B"]
 
+# midi = 69 + 12*log2(f/440) rewritten as midi = log(f)*_MIDI_K + _MIDI_C,
+# folding the division and the log-base change into two constants.
+_MIDI_K = 12.0 / math.log(2.0)
+_MIDI_C = 69.0 - _MIDI_K * math.log(440.0)
+
+# All 128 MIDI note names, formatted once at import time.
+_MIDI_NAMES = [f"{NOTE_NAMES[i % 12]}{i // 12 - 1}" for i in range(128)]
+
 
 def freq_to_note(freq_hz):
     """
@@ -141,75 +344,127 @@ def freq_to_note(freq_hz):
         return "--", 0.0
 
     # A4 = MIDI 69 = 440 Hz
-    # MIDI number from frequency:
-    #   midi = 69 + 12 * log2(f / 440)
-    midi_float = 69 + 12 * math.log2(freq_hz / 440.0)
+    midi_float = math.log(freq_hz) * _MIDI_K + _MIDI_C
     midi_int = int(round(midi_float))
 
     # Clamp to a reasonable MIDI range (0–127)
     midi_int = max(0, min(127, midi_int))
 
-    # Note name and octave
-    note_index = midi_int % 12
-    octave = midi_int // 12 - 1
-    note_name = f"{NOTE_NAMES[note_index]}{octave}"
-
     # Cents difference from the nearest equal-tempered note
     cents = (midi_float - midi_int) * 100.0
 
-    return note_name, cents
+    return _MIDI_NAMES[midi_int], cents
+
+
+def run(on_freq=None):
+    """Capture and analyze audio without the matplotlib display.
+
+    Blocks until interrupted. If given, ``on_freq`` is called with the
+    latest frequency estimate (Hz) after each audio block.
+    """
+    _warmup_kernels()
+
+    def callback(indata, frames, time, status):
+        audio_callback(indata, frames, time, status)
+        if on_freq is not None:
+            on_freq(latest_freq)
+
+    stream = sd.InputStream(
+        samplerate=SAMPLE_RATE,
+        channels=CHANNELS,
+        blocksize=BLOCK_SIZE,
+        dtype="int16",
+        callback=callback,
+    )
+    with stream:
+        while True:
+            sd.sleep(1000)
 
 
 def main():
     global latest_freq
 
-    # Start processing thread
-    worker_thread = threading.Thread(target=process_audio_blocks, daemon=True)
-    worker_thread.start()
+    # Trigger JIT compilation of the audio kernels now, before the
+    # stream opens: the first call to each kernel compiles it, and that
+    # must never happen on the realtime callback thread.
+    _warmup_kernels()
 
-    # Set up matplotlib figure
+    # Set up matplotlib figure. The line and the frequency readout are
+    # marked animated so the initial draw captures a background without
+    # them; each frame then restores that background and redraws just the
+    # two artists (blitting) instead of rerendering the whole figure.
     plt.ion()
     fig, ax = plt.subplots()
     x = np.arange(PLOT_SAMPLES) / SAMPLE_RATE  # time axis in seconds
-    line, = ax.plot(x, np.zeros(PLOT_SAMPLES))
+    line, = ax.plot(x, np.zeros(PLOT_SAMPLES), animated=True)
     ax.set_ylim(-1.0, 1.0)
     ax.set_xlim(0, x[-1])
     ax.set_xlabel("Time (s)")
     ax.set_ylabel("Amplitude")
-    ax.set_title("Live Waveform - Dominant frequency: -- Hz")
+    ax.set_title("Live Waveform")
+    # Frequency/note readout lives inside the axes (a blitted artist);
+    # updating the title would force a full-figure redraw.
+    readout = ax.text(
+        0.02, 0.95, "-- Hz", transform=ax.transAxes,
+        va="top", animated=True,
+    )
     fig.tight_layout()
 
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(ax.bbox)
+
+    # A window resize invalidates the captured background.
+    def _on_resize(event):
+        nonlocal background
+        fig.canvas.draw()
+        background = fig.canvas.copy_from_bbox(ax.bbox)
+
+    fig.canvas.mpl_connect("resize_event", _on_resize)
+
     # Open input stream
     stream = sd.InputStream(
         samplerate=SAMPLE_RATE,
         channels=CHANNELS,
         blocksize=BLOCK_SIZE,
+        dtype="int16",
         callback=audio_callback,
     )
 
     print("Starting audio stream. Close the plot window to stop.")
+    frame_interval = 1.0 / PLOT_FPS
+    last_readout_freq = None
     with stream:
         while plt.fignum_exists(fig.number):
+            frame_start = _time.perf_counter()
+
             # Update waveform data
             y = get_latest_plot_samples()
             if len(y) == PLOT_SAMPLES:
                 line.set_ydata(y)
 
-                note_name, cents = freq_to_note(latest_freq)
-                # Example title:
-                # Live Waveform - 440.0 Hz - A4 (+0.3 cents)
-                ax.set_title(
-                    f"Live Waveform - {latest_freq:7.1f} Hz - "
-                    f"{note_name} ({cents:+5.1f} cents)"
-                )
-
-            fig.canvas.draw()
+                # Only reformat the readout when the displayed (0.1 Hz
+                # rounded) frequency actually changes between frames.
+                freq_rounded = round(latest_freq, 1)
+                if freq_rounded != last_readout_freq:
+                    last_readout_freq = freq_rounded
+                    note_name, cents = freq_to_note(latest_freq)
+                    # Example readout: 440.0 Hz - A4 (+0.3 cents)
+                    readout.set_text(
+                        f"{freq_rounded:7.1f} Hz - "
+                        f"{note_name} ({cents:+5.1f} cents)"
+                    )
+
+            # Blit: restore the cached background, redraw only the two
+            # animated artists, and push just the axes region.
+            fig.canvas.restore_region(background)
+            ax.draw_artist(line)
+            ax.draw_artist(readout)
+            fig.canvas.blit(ax.bbox)
             fig.canvas.flush_events()
-            plt.pause(0.01)
 
-    # Stop worker thread
-    audio_queue.put(None)
-    worker_thread.join()
+            elapsed = _time.perf_counter() - frame_start
+            _time.sleep(max(0.0, frame_interval - elapsed))
+
     print("Stopped.")
 
 